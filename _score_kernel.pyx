@@ -0,0 +1,120 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""Noyaux de score compilés (Cython).
+
+score_sums a le même contrat que compute_score._score_kernel et score_flows
+celui de compute_score._score_flows, sans temps de compilation JIT : utile
+pour les exécutions uniques en ligne de commande.
+Compilation : python setup.py build_ext --inplace
+"""
+import numpy as np
+
+from libc.math cimport exp2, fabs
+from libc.stdint cimport int64_t, uint64_t
+from libc.stdlib cimport free, malloc, qsort
+
+
+cdef int _cmp_u64(const void *a, const void *b) noexcept nogil:
+    cdef uint64_t va = (<const uint64_t *>a)[0]
+    cdef uint64_t vb = (<const uint64_t *>b)[0]
+    return (va > vb) - (va < vb)
+
+
+cdef Py_ssize_t _flow_sums(const double[::1] t, const double[::1] x,
+                           const double[::1] y, const double[::1] z,
+                           Py_ssize_t a, Py_ssize_t b, double inv_s,
+                           double t_start, double ax, double ay,
+                           const double[::1] decay, bint with_u2g,
+                           uint64_t *packed, double *sums) noexcept nogil:
+    """Sommes (U2G, délai, distance) des enregistrements [a, b) dans sums,
+    renvoie le nombre de points d'atterrissage. packed : tampon de b - a clés."""
+    cdef Py_ssize_t n_decay = decay.shape[0]
+    cdef Py_ssize_t i, n = b - a, k = 0
+    cdef double u2g_sum = 0.0, delay_sum = 0.0, dist_sum = 0.0, r
+    cdef int64_t h
+
+    for i in range(a, b):
+        r = z[i] * inv_s
+        if with_u2g:
+            u2g_sum += r
+        delay_sum += r * (10.0 / ((t[i] - t_start) + 10.0))
+        h = <int64_t>(fabs(x[i] - ax) + fabs(y[i] - ay))
+        if h < n_decay:
+            dist_sum += r * decay[h]
+        else:
+            dist_sum += r * exp2(-0.1 * h)
+        packed[i - a] = (<uint64_t>x[i] << 32) | <uint64_t>y[i]
+
+    # Points d'atterrissage distincts : tri puis transitions
+    if n > 0:
+        qsort(packed, n, sizeof(uint64_t), _cmp_u64)
+        k = 1
+        for i in range(1, n):
+            if packed[i] != packed[i - 1]:
+                k += 1
+
+    sums[0] = u2g_sum
+    sums[1] = delay_sum
+    sums[2] = dist_sum
+    return k
+
+
+def score_sums(const double[::1] t, const double[::1] x, const double[::1] y,
+               const double[::1] z, double inv_s, double t_start, double ax,
+               double ay, const double[::1] decay, bint with_u2g):
+    """Sommes brutes (U2G, délai, distance) et nombre de points d'atterrissage.
+
+    with_u2g=False : somme U2G non calculée (0.0), faite en entier par l'appelant.
+    """
+    cdef Py_ssize_t n = t.shape[0], k
+    cdef double sums[3]
+    cdef uint64_t *packed
+
+    if n == 0:
+        return 0.0, 0.0, 0.0, 0
+
+    packed = <uint64_t *>malloc(n * sizeof(uint64_t))
+    if packed == NULL:
+        raise MemoryError()
+    try:
+        with nogil:
+            k = _flow_sums(t, x, y, z, 0, n, inv_s, t_start, ax, ay,
+                           decay, with_u2g, packed, sums)
+    finally:
+        free(packed)
+    return sums[0], sums[1], sums[2], k
+
+
+def score_flows(const double[::1] t, const double[::1] x, const double[::1] y,
+                const double[::1] z, const int64_t[::1] offsets,
+                const double[::1] inv_sizes, const double[::1] t_starts,
+                const double[::1] ax, const double[::1] ay,
+                const double[::1] decay, bint with_u2g):
+    """Sommes par flux (format CSR) : tableaux (u2g, delay, dist, k)."""
+    cdef Py_ssize_t FN = offsets.shape[0] - 1
+    cdef Py_ssize_t f, n = t.shape[0]
+    cdef double sums[3]
+    cdef uint64_t *packed
+
+    u2g_arr = np.zeros(FN)
+    delay_arr = np.zeros(FN)
+    dist_arr = np.zeros(FN)
+    k_arr = np.zeros(FN, dtype=np.int64)
+    cdef double[::1] u2g = u2g_arr, delay = delay_arr, dist = dist_arr
+    cdef int64_t[::1] k = k_arr
+
+    # Un seul tampon de clés pour tous les flux (chaque flux en utilise un segment)
+    packed = <uint64_t *>malloc((n if n > 0 else 1) * sizeof(uint64_t))
+    if packed == NULL:
+        raise MemoryError()
+    try:
+        with nogil:
+            for f in range(FN):
+                k[f] = _flow_sums(t, x, y, z, offsets[f], offsets[f + 1],
+                                  inv_sizes[f], t_starts[f], ax[f], ay[f],
+                                  decay, with_u2g, packed + offsets[f], sums)
+                u2g[f] = sums[0]
+                delay[f] = sums[1]
+                dist[f] = sums[2]
+    finally:
+        free(packed)
+    return u2g_arr, delay_arr, dist_arr, k_arr
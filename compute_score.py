@@ -1,104 +1,416 @@
 import math
-from collections import defaultdict
+import os
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    # Noyau Cython optionnel (python setup.py build_ext --inplace)
+    from _score_kernel import score_flows as _cython_score_flows
+    from _score_kernel import score_sums as _cython_score_sums
+except ImportError:
+    _cython_score_flows = _cython_score_sums = None
+
+# numba n'est importé (~250 ms) que si le noyau compilé est absent
+HAS_NUMBA = False
+if _cython_score_flows is None:
+    try:
+        from numba import njit, prange
+        HAS_NUMBA = True
+    except ImportError:
+        pass
+
 
 def read_input_file(path):
     """Lit un fichier input et renvoie la topologie et la liste des flux."""
     with open(path, "r") as f:
-        lines = [l.strip() for l in f.readlines() if l.strip()]
-    
-    M, N, FN, T = map(int, lines[0].split())
-    idx = 1
-    uavs = {}
-    for _ in range(M * N):
-        x, y, B, phi = lines[idx].split()
-        uavs[(int(x), int(y))] = {"B": float(B), "phi": int(phi)}
-        idx += 1
-    
-    flows = {}
-    for i in range(FN):
-        f, x, y, t_start, s, m1, n1, m2, n2 = map(int, lines[idx].split())
-        flows[f] = {
-            "access": (x, y),
-            "t_start": t_start,
-            "size": s,
-            "range": (m1, n1, m2, n2)
-        }
-        idx += 1
-    
+        # Lignes vides ignorées partout : max_rows compte alors les mêmes
+        # lignes quelle que soit la version de numpy, sans avertissement
+        lines = (line for line in f if line.strip())
+        # Première ligne non vide ; fichier vide -> erreur au lieu de boucler
+        header = next(lines, None)
+        if header is None:
+            raise ValueError(f"Empty input file: {path}")
+        M, N, FN, T = map(int, header.split())
+        # Blocs UAV et flux lus d'un coup par le parseur C de numpy
+        uav_arr = np.loadtxt(lines, max_rows=M * N, ndmin=2)
+        flow_arr = np.loadtxt(lines, dtype=np.int64, max_rows=FN, ndmin=2)
+
+    # Stockage colonnaire (SoA) : une colonne numpy par champ, indexée
+    # par la position de la ligne dans le fichier
+    uavs = {
+        "x": uav_arr[:, 0].astype(np.int64),
+        "y": uav_arr[:, 1].astype(np.int64),
+        "B": uav_arr[:, 2].copy(),
+        "phi": uav_arr[:, 3].astype(np.int64),
+    }
+    flows = {
+        "id": flow_arr[:, 0].copy(),
+        "ax": flow_arr[:, 1].copy(),
+        "ay": flow_arr[:, 2].copy(),
+        "t_start": flow_arr[:, 3].copy(),
+        "size": flow_arr[:, 4].copy(),
+        "range": flow_arr[:, 5:9].copy(),
+    }
+
     return {"M": M, "N": N, "FN": FN, "T": T, "uavs": uavs, "flows": flows}
 
 
-def read_output_file(path):
-    """Lit un fichier output de ton algo génétique."""
-    flows_out = {}
-    with open(path, "r") as f:
-        lines = [l.strip() for l in f.readlines() if l.strip()]
-    
+def get_flow_info(flows, i):
+    """Renvoie le i-ème flux des colonnes SoA sous forme de dict."""
+    return {
+        "access": (int(flows["ax"][i]), int(flows["ay"][i])),
+        "t_start": int(flows["t_start"][i]),
+        "size": int(flows["size"][i]),
+        "range": tuple(flows["range"][i].tolist()),
+    }
+
+
+@lru_cache(maxsize=4)
+def _read_input_cached(path, mtime_ns, size):
+    """read_input_file mémoïsé ; mtime et taille dans la clé invalident le cache
+    si le fichier est modifié."""
+    return read_input_file(path)
+
+
+# Enregistrement de sortie : 20 octets, colonnes accessibles par nom.
+# INT_RECORD_DTYPE est utilisé quand tous les volumes z sont entiers
+RECORD_DTYPE = np.dtype([("t", np.int32), ("x", np.int32), ("y", np.int32), ("z", np.float64)])
+INT_RECORD_DTYPE = np.dtype([("t", np.int32), ("x", np.int32), ("y", np.int32), ("z", np.int64)])
+
+
+def _check_int32(values, what):
+    """Lève ValueError si des valeurs ne sont pas des entiers int32 (au lieu
+    d'une troncature ou d'un débordement silencieux à la conversion)."""
+    if not np.array_equal(values, np.rint(values)):
+        raise ValueError(f"Non-integer {what} in output file")
+    info = np.iinfo(np.int32)
+    if values.size and (values.min() < info.min or values.max() > info.max):
+        raise ValueError(f"{what} out of int32 range in output file")
+
+
+def _to_records(arr):
+    """Convertit un tableau (p, 4) de colonnes (t, x, y, z) en tableau
+    INT_RECORD_DTYPE si tous les z sont entiers, RECORD_DTYPE sinon."""
+    _check_int32(arr[:, :3], "t/x/y value")
+    z = arr[:, 3]
+    dtype = INT_RECORD_DTYPE if np.array_equal(z, np.rint(z)) else RECORD_DTYPE
+    records = np.empty(len(arr), dtype=dtype)
+    for j, name in enumerate(dtype.names):
+        records[name] = arr[:, j]
+    return records
+
+
+def _record_columns(records):
+    """Colonnes (t, x, y, z) float64 contiguës pour les noyaux de score."""
+    return tuple(np.ascontiguousarray(records[name], dtype=np.float64)
+                 for name in RECORD_DTYPE.names)
+
+
+def _read_output_arrays(path):
+    """Lit un fichier output en tableaux plats.
+
+    Renvoie (flow_ids, counts, records) : identifiant et nombre
+    d'enregistrements de chaque bloc, et records (tableau RECORD_DTYPE ou
+    INT_RECORD_DTYPE), blocs concaténés dans l'ordre du fichier.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    # Fichier vide ou blanc : aucun flux (score 0), comme l'ancien parseur
+    if not data.strip():
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                _to_records(np.empty((0, 4))))
+    # Tous les jetons convertis d'un coup ; un jeton invalide lève ValueError
+    # au lieu d'un score calculé sur une lecture partielle
+    tokens = np.array(data.split(), dtype=np.float64)
+
+    # Blocs "f p" suivis de p lignes de 4 valeurs : seules les positions des
+    # en-têtes sont parcourues en Python, puis retirées par masque
+    header_pos = []
     idx = 0
-    while idx < len(lines):
-        f, p = map(int, lines[idx].split())
-        idx += 1
-        records = []
-        for _ in range(p):
-            t, x, y, z = lines[idx].split()
-            records.append((int(t), int(x), int(y), float(z)))
-            idx += 1
-        flows_out[f] = records
-    return flows_out
+    while idx < tokens.size:
+        header_pos.append(idx)
+        p = tokens[idx + 1]
+        if p != int(p) or p < 0:
+            raise ValueError(f"Invalid record count in output file: {p}")
+        idx += 2 + 4 * int(p)
+    header_pos = np.array(header_pos, dtype=np.int64)
+    _check_int32(tokens[header_pos], "flow id")
+
+    is_record = np.ones(tokens.size, dtype=bool)
+    is_record[header_pos] = False
+    is_record[header_pos + 1] = False
+    flow_ids = tokens[header_pos].astype(np.int64)
+    counts = tokens[header_pos + 1].astype(np.int64)
+    return flow_ids, counts, _to_records(tokens[is_record].reshape(-1, 4))
+
+
+def read_output_file(path):
+    """Lit un fichier output de ton algo génétique.
+
+    Renvoie pour chaque flux un tableau RECORD_DTYPE (INT_RECORD_DTYPE si
+    tous les volumes sont entiers) de p enregistrements (champs t, x, y, z).
+    """
+    flow_ids, counts, records = _read_output_arrays(path)
+    return dict(zip(flow_ids.tolist(), np.split(records, np.cumsum(counts)[:-1])))
+
+
+def _pack_xy(x, y):
+    """Clé uint64 (x << 32) | y d'un point d'atterrissage."""
+    return (x.astype(np.uint64) << np.uint64(32)) | y.astype(np.uint64)
+
+
+def _integer_sent(z, offsets):
+    """Volume envoyé par flux (format CSR) à partir de volumes z int64. La somme
+    entière est exacte : u2g vaut exactement 1.0 quand tout le flux est transmis."""
+    cum = np.zeros(z.size + 1, dtype=np.int64)
+    np.cumsum(z, out=cum[1:])
+    return cum[offsets[1:]] - cum[offsets[:-1]]
+
+
+def _decay_table(size):
+    """Table decay[h] = 2^(-0.1 h) pour les distances de Manhattan 0..size-1."""
+    return np.exp2(-0.1 * np.arange(size))
+
+
+# Table par défaut pour compute_flow_score (dimensions de la grille inconnues)
+_DEFAULT_DECAY = _decay_table(128)
+
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _count_unique(packed):
+        """Nombre de valeurs distinctes d'un tableau uint64 (trié sur place)."""
+        if packed.size == 0:
+            return 0
+        packed.sort()
+        k = 1
+        for i in range(1, packed.size):
+            if packed[i] != packed[i - 1]:
+                k += 1
+        return k
+
+    @njit(fastmath=True, cache=True)
+    def _score_kernel(t, x, y, z, inv_s, t_start, ax, ay, decay, with_u2g):
+        """Sommes brutes (U2G, délai, distance) et nombre de points d'atterrissage.
+
+        with_u2g=False : somme U2G non calculée (0.0), faite en entier par l'appelant."""
+        n = t.size
+        u2g_sum = 0.0
+        delay_sum = 0.0
+        dist_sum = 0.0
+        packed = np.empty(n, dtype=np.uint64)
+        for i in range(n):
+            r = z[i] * inv_s
+            if with_u2g:
+                u2g_sum += r
+            delay_sum += r * (10.0 / ((t[i] - t_start) + 10.0))
+            h = np.int64(np.fabs(x[i] - ax) + np.fabs(y[i] - ay))
+            if h < decay.size:
+                dist_sum += r * decay[h]
+            else:
+                dist_sum += r * np.exp2(-0.1 * h)
+            packed[i] = (np.uint64(x[i]) << np.uint64(32)) | np.uint64(y[i])
+        return u2g_sum, delay_sum, dist_sum, _count_unique(packed)
+else:
+    def _lookup_decay(h, decay):
+        """decay[h] par indexation ; exp2 si une distance dépasse la table."""
+        hi = h.astype(np.int64)
+        if hi.size and hi.max() >= decay.size:
+            return np.exp2(-0.1 * h)
+        return decay[hi]
+
+    def _score_kernel(t, x, y, z, inv_s, t_start, ax, ay, decay, with_u2g):
+        """Sommes brutes (U2G, délai, distance) et nombre de points d'atterrissage.
 
+        with_u2g=False : somme U2G non calculée (0.0), faite en entier par l'appelant."""
+        # Facteurs (1, délai, distance) en lignes : un seul produit avec
+        # ratio donne toutes les sommes (sans la ligne U2G si inutile)
+        h = np.abs(x - ax) + np.abs(y - ay)
+        factors = np.empty((3, t.size))
+        factors[0] = 1.0
+        factors[1] = 10 / ((t - t_start) + 10)
+        factors[2] = _lookup_decay(h, decay)
+        if with_u2g:
+            u2g_sum, delay_sum, dist_sum = factors @ (z * inv_s)
+        else:
+            u2g_sum = 0.0
+            delay_sum, dist_sum = factors[1:] @ (z * inv_s)
+        return u2g_sum, delay_sum, dist_sum, np.unique(_pack_xy(x, y)).size
 
-def manhattan(a, b):
-    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+# Cache LRU des scores par flux : un algo génétique réévalue souvent des
+# plans identiques. Clé = constantes du flux + octets des enregistrements.
+FLOW_SCORE_CACHE_SIZE = 65536
+_flow_score_cache = OrderedDict()
 
 
 def compute_flow_score(flow_info, records):
     """Calcule le score d'un flux selon les formules du PDF."""
+    # Constantes du flux extraites une fois (1/s : multiplications au lieu de divisions)
     s = flow_info["size"]
-    access = flow_info["access"]
+    ax, ay = flow_info["access"]
     t_start = flow_info["t_start"]
-    if not records or s <= 0:
+    if len(records) == 0 or s <= 0:
         return 0.0
+    inv_s = 1.0 / s
+
+    # Enregistrements RECORD_DTYPE/INT_RECORD_DTYPE (ou tuples / tableau (p, 4) convertis)
+    arr = np.asarray(records)
+    if arr.dtype not in (RECORD_DTYPE, INT_RECORD_DTYPE):
+        arr = _to_records(arr.astype(np.float64).reshape(-1, 4))
+    integral = arr.dtype == INT_RECORD_DTYPE
+    key = (s, ax, ay, t_start, arr.tobytes())
+    cached = _flow_score_cache.get(key)
+    if cached is not None:
+        _flow_score_cache.move_to_end(key)
+        return cached
+
+    t, x, y, z = _record_columns(arr)
+    # Noyau compilé si disponible : pas de temps de compilation JIT
+    kernel = _cython_score_sums if _cython_score_sums is not None else _score_kernel
+    u2g_sum, delay_sum, dist_sum, k = kernel(
+        t, x, y, z, inv_s, float(t_start), float(ax), float(ay), _DEFAULT_DECAY,
+        not integral)
 
     # 1. Total U2G Traffic Score
-    total_sent = sum(z for _, _, _, z in records)
-    u2g_score = min(1.0, total_sent / s)
+    if integral:
+        u2g_sum = int(arr["z"].sum()) / s
+    u2g_score = min(1.0, u2g_sum)
 
     # 2. Traffic Delay Score (pondère plus les transferts précoces)
     # Le délai est calculé par rapport au t_start du flux
-    delay_sum = sum((z / s) * (10 / ((t - t_start) + 10)) for t, _, _, z in records)
     delay_score = min(1.0, delay_sum)
 
     # 3. Transmission Distance Score
-    distance_score = 0.0
-    for t, x, y, z in records:
-        h = manhattan(access, (x, y))
-        distance_score += (z / s) * (2 ** (-0.1 * h))
-    distance_score = min(1.0, distance_score)
+    distance_score = min(1.0, dist_sum)
 
     # 4. Landing Point Score
-    landing_points = {(x, y) for _, x, y, _ in records}
-    k = max(1, len(landing_points))
-    landing_score = 1.0 / k
+    landing_score = 1.0 / max(1, k)
 
     total = 100 * (0.4 * u2g_score + 0.2 * delay_score +
                    0.3 * distance_score + 0.1 * landing_score)
+
+    _flow_score_cache[key] = total
+    if len(_flow_score_cache) > FLOW_SCORE_CACHE_SIZE:
+        _flow_score_cache.popitem(last=False)
     return total
 
 
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _score_flows(t, x, y, z, offsets, inv_sizes, t_starts, ax, ay, decay, with_u2g):
+        """Applique _score_kernel à chaque flux (format CSR), en parallèle."""
+        FN = offsets.size - 1
+        u2g = np.zeros(FN)
+        delay = np.zeros(FN)
+        dist = np.zeros(FN)
+        k = np.zeros(FN, dtype=np.int64)
+        for f in prange(FN):
+            a, b = offsets[f], offsets[f + 1]
+            u2g[f], delay[f], dist[f], k[f] = _score_kernel(
+                t[a:b], x[a:b], y[a:b], z[a:b], inv_sizes[f], t_starts[f], ax[f], ay[f], decay,
+                with_u2g)
+        return u2g, delay, dist, k
+else:
+    def _score_flows(t, x, y, z, offsets, inv_sizes, t_starts, ax, ay, decay, with_u2g):
+        """Sommes par flux (format CSR) agrégées en une seule réduction."""
+        FN = offsets.size - 1
+        counts = np.diff(offsets)
+        flow_idx = np.repeat(np.arange(FN), counts)
+        ratio = z * inv_sizes[flow_idx]
+        h = np.abs(x - ax[flow_idx]) + np.abs(y - ay[flow_idx])
+
+        # Contributions (délai, distance[, U2G]) côte à côte, sommées par
+        # segment de flux en un seul np.add.reduceat
+        contrib = np.empty((z.size, 3 if with_u2g else 2))
+        contrib[:, 0] = ratio * (10 / ((t - t_starts[flow_idx]) + 10))
+        contrib[:, 1] = ratio * _lookup_decay(h, decay)
+        if with_u2g:
+            contrib[:, 2] = ratio
+        sums = np.zeros((FN, contrib.shape[1]))
+        nonempty = counts > 0
+        if nonempty.any():
+            sums[nonempty] = np.add.reduceat(contrib, offsets[:-1][nonempty], axis=0)
+        delay, dist = sums[:, 0], sums[:, 1]
+        u2g = sums[:, 2] if with_u2g else np.zeros(FN)
+
+        # Points d'atterrissage distincts : tri par (flux, xy) puis transitions
+        xy_packed = _pack_xy(x, y)
+        order = np.lexsort((xy_packed, flow_idx))
+        sorted_flow, sorted_xy = flow_idx[order], xy_packed[order]
+        is_new = np.ones(len(order), dtype=bool)
+        is_new[1:] = (np.diff(sorted_flow) != 0) | (np.diff(sorted_xy) != 0)
+        k = np.bincount(sorted_flow[is_new], minlength=FN)
+        return u2g, delay, dist, k
+
+
 def compute_total_score(input_file, output_file):
-    """Calcule le score global."""
-    inp = read_input_file(input_file)
-    out = read_output_file(output_file)
-    total_weighted = 0.0
-    total_size = sum(f["size"] for f in inp["flows"].values())
-    details = {}
-
-    for f_id, flow in inp["flows"].items():
-        score = compute_flow_score(flow, out.get(f_id, []))
-        weight = flow["size"] / total_size
-        total_weighted += score * weight
-        details[f_id] = score
+    """Calcule le score global.
+
+    Les enregistrements de tous les flux sont rangés dans un seul tableau,
+    groupés par flux (offsets au format CSR), puis scorés en un seul appel
+    à _score_flows.
+    """
+    st = os.stat(input_file)
+    inp = _read_input_cached(os.path.abspath(input_file), st.st_mtime_ns, st.st_size)
+    out_ids, out_counts, out_records = _read_output_arrays(output_file)
+    flows = inp["flows"]
+    f_ids = flows["id"].tolist()
+    FN = len(f_ids)
+
+    sizes = flows["size"].astype(np.float64)
+    t_starts = flows["t_start"].astype(np.float64)
+    ax = flows["ax"].astype(np.float64)
+    ay = flows["ay"].astype(np.float64)
+
+    # Indice (ordre de l'entrée) de chaque bloc de sortie : -1 pour un flux
+    # inconnu ou un bloc répété (seul le dernier est gardé)
+    id2idx = dict(zip(f_ids, range(FN)))
+    out_list = out_ids.tolist()
+    last = {f: i for i, f in enumerate(out_list)}
+    out_idx = np.array([id2idx.get(f, -1) if last[f] == i else -1
+                        for i, f in enumerate(out_list)], dtype=np.int64)
+
+    # Enregistrements regroupés dans l'ordre des flux + offsets CSR
+    rec_idx = np.repeat(out_idx, out_counts)
+    keep = rec_idx >= 0
+    rec_idx = rec_idx[keep]
+    records_all = out_records[keep]
+    if np.any(rec_idx[1:] < rec_idx[:-1]):
+        order = np.argsort(rec_idx, kind="stable")
+        rec_idx, records_all = rec_idx[order], records_all[order]
+    counts = np.bincount(rec_idx, minlength=FN)
+    offsets = np.zeros(FN + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    t, x, y, z = _record_columns(records_all)
+
+    # Volumes entiers (décidé au parsing) : U2G exact en int64, pas dans le noyau
+    integral = records_all.dtype == INT_RECORD_DTYPE
+    safe_sizes = np.where(sizes > 0, sizes, 1.0)
+    inv_sizes = 1.0 / safe_sizes
+    # Noyau compilé si disponible : pas de temps de compilation JIT
+    score_flows = _cython_score_flows if _cython_score_flows is not None else _score_flows
+    u2g, delay, dist, k = score_flows(
+        t, x, y, z, offsets, inv_sizes, t_starts, ax, ay,
+        _decay_table(inp["M"] + inp["N"] + 1), not integral)
+    if integral:
+        u2g = _integer_sent(records_all["z"], offsets) / safe_sizes
+
+    scores = 100 * (0.4 * np.minimum(1.0, u2g) + 0.2 * np.minimum(1.0, delay) +
+                    0.3 * np.minimum(1.0, dist) + 0.1 / np.maximum(1, k))
+    # Flux sans enregistrement ou de taille nulle : score 0
+    scores[(counts == 0) | (sizes <= 0)] = 0.0
 
+    # Pondération par la taille ; tailles toutes nulles -> erreur explicite
+    # (comme l'ancienne division Python) plutôt qu'un score nan
+    total_size = sizes.sum()
+    if FN and total_size == 0:
+        raise ZeroDivisionError("Total flow size is zero: cannot weight flow scores")
+    weights = sizes / total_size
+    total_weighted = float((scores * weights).sum())
+    details = dict(zip(f_ids, scores.tolist()))
     return total_weighted, details
 
 
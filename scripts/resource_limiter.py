@@ -9,11 +9,31 @@ import time
 import json
 import sys
 import os
-import threading
 import platform
+import select
+import selectors
+import shutil
+import signal
+import threading
 from datetime import datetime
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import win32api
+    import win32con
+    import win32job
+except ImportError:  # pywin32 absent (ou système non-Windows)
+    win32job = None
+
+
+# Messages d'un programme dont l'allocation a échoué (RLIMIT_AS, Job Object)
+ALLOCATION_FAILURE_MARKERS = (b"std::bad_alloc", b"Cannot allocate memory")
+
 
 class ResourceLimiter:
     """Classe pour exécuter un programme avec des limitations de ressources"""
@@ -133,165 +153,81 @@ class ResourceLimiter:
             # Préparer l'entrée
             stdin_data = self._prepare_input(input_data)
             
+            # Limites noyau préparées avant le lancement (RLIMIT_AS),
+            # pour qu'elles s'appliquent dès l'exec du programme
+            limits = self._prepare_kernel_limits(verbose)
+            
             # Démarrer le processus
             start_time = time.time()
             
-            process = subprocess.Popen(
-                [str(self.executable_path)],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            # CORRECTION: Gérer stdin/stdout/stderr dans des threads pour éviter les deadlocks
-            # Les pipes ont une taille limitée - si on ne lit pas, le programme se bloque!
-            stdout_data = []
-            stderr_data = []
-            
-            def write_stdin():
-                try:
-                    if stdin_data:
-                        process.stdin.write(stdin_data)
-                        process.stdin.flush()
-                    process.stdin.close()
-                except (BrokenPipeError, OSError):
-                    pass
-            
-            def read_stdout():
-                try:
-                    for line in process.stdout:
-                        stdout_data.append(line)
-                except:
-                    pass
-            
-            def read_stderr():
-                try:
-                    for line in process.stderr:
-                        stderr_data.append(line)
-                except:
-                    pass
-            
-            # Démarrer les threads
-            stdin_thread = threading.Thread(target=write_stdin)
-            stdout_thread = threading.Thread(target=read_stdout)
-            stderr_thread = threading.Thread(target=read_stderr)
-            
-            stdin_thread.daemon = True
-            stdout_thread.daemon = True
-            stderr_thread.daemon = True
-            
-            stdin_thread.start()
-            stdout_thread.start()
-            stderr_thread.start()
-            
-            # Obtenir l'objet psutil pour monitorer les ressources
+            # close_fds=False, des chemins absolus et aucun preexec_fn
+            # permettent à subprocess de lancer via posix_spawn (vfork) au lieu
+            # de fork+exec : sous Linux la limite mémoire passe donc par le
+            # préfixe prlimit plutôt que par un preexec_fn. Les descripteurs
+            # Python étant non héritables par défaut (PEP 446), seuls les pipes
+            # sont transmis à l'enfant
             try:
-                ps_process = psutil.Process(process.pid)
-            except psutil.NoSuchProcess:
-                results["error"] = "Process terminated immediately"
-                return results
-            
-            # Monitoring des ressources
-            memory_samples = []
-            cpu_samples = []
-            cpu_exceeded_count = 0  # Compteur pour éviter les faux positifs
-            
-            # Appliquer les limites CPU selon le système d'exploitation
-            self._apply_cpu_limits(ps_process, verbose)
-            
-            if verbose:
-                num_cores = psutil.cpu_count(logical=True)
-                print(f"🚀 Starting process (PID: {process.pid})...")
-                print(f"⏱️  Timeout: {self.config['timeout_seconds']}s")
-                print(f"💾 Max Memory: {self.config['max_memory_mb']} MB")
-                print(f"🖥️  Max CPU: {self.config['max_cpu_percent']}% per core (System: {num_cores} cores)")
-                print("-" * 60)
+                process = subprocess.Popen(
+                    limits.get("prefix", []) + [str(self.executable_path.resolve())],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    close_fds=(os.name == 'nt'),
+                    preexec_fn=limits.get("preexec")
+                )
+            except BaseException:
+                self._release_kernel_limits(limits)
+                raise
             
-            # Boucle de monitoring
-            while True:
-                # Vérifier si le processus est terminé
-                if process.poll() is not None:
-                    break
+            try:
+                # Obtenir l'objet psutil pour monitorer les ressources
+                try:
+                    ps_process = psutil.Process(process.pid)
+                except psutil.NoSuchProcess:
+                    results["error"] = "Process terminated immediately"
+                    return results
                 
-                # Vérifier le timeout
-                elapsed = time.time() - start_time
-                if elapsed > self.config['timeout_seconds']:
-                    results["timeout"] = True
-                    process.terminate()
-                    try:
-                        process.wait(timeout=2)
-                    except subprocess.TimeoutExpired:
-                        process.kill()
-                    if verbose:
-                        print(f"⏰ TIMEOUT after {elapsed:.2f}s")
-                    break
+                # Appliquer les limites CPU selon le système d'exploitation
+                self._apply_cpu_limits(ps_process, verbose)
                 
-                # Mesurer les ressources
-                try:
-                    # Mémoire
-                    mem_info = ps_process.memory_info()
-                    memory_mb = mem_info.rss / (1024 * 1024)
-                    memory_samples.append(memory_mb)
-                    
-                    # CPU (nécessite un intervalle pour être précis)
-                    cpu_percent = ps_process.cpu_percent(interval=None)
-                    if cpu_percent > 0:  # Ignorer les valeurs nulles initiales
-                        cpu_samples.append(cpu_percent)
-                    
-                    # Vérifier les limites de mémoire
-                    if memory_mb > self.config['max_memory_mb']:
-                        results["memory_exceeded"] = True
-                        process.terminate()
-                        try:
-                            process.wait(timeout=2)
-                        except subprocess.TimeoutExpired:
-                            process.kill()
-                        if verbose:
-                            print(f"💥 MEMORY LIMIT EXCEEDED: {memory_mb:.2f} MB")
-                        break
-                    
-                    # Vérifier et limiter le CPU
-                    # Note: La limitation stricte du CPU sous Windows est complexe
-                    # On utilise une approche de "kill si dépassement prolongé"
-                    if cpu_percent > self.config['max_cpu_percent'] * 1.5:  # Tolérance de 50%
-                        cpu_exceeded_count += 1
-                        if cpu_exceeded_count >= 10:  # 10 échantillons consécutifs = 1 seconde
-                            results["cpu_exceeded"] = True
-                            process.terminate()
-                            try:
-                                process.wait(timeout=2)
-                            except subprocess.TimeoutExpired:
-                                process.kill()
-                            if verbose:
-                                print(f"💥 CPU LIMIT EXCEEDED: {cpu_percent:.1f}% > {self.config['max_cpu_percent']}%")
-                            break
-                    else:
-                        cpu_exceeded_count = 0  # Reset si le CPU redescend
-                    
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    break
+                # Windows : le Job Object ne peut être assigné qu'après le lancement
+                self._assign_job_object(process, limits, verbose)
+                
+                if verbose:
+                    num_cores = psutil.cpu_count(logical=True)
+                    print(f"🚀 Starting process (PID: {process.pid})...")
+                    print(f"⏱️  Timeout: {self.config['timeout_seconds']}s")
+                    print(f"💾 Max Memory: {self.config['max_memory_mb']} MB")
+                    print(f"🖥️  Max CPU: {self.config['max_cpu_percent']}% per core (System: {num_cores} cores)")
+                    print("-" * 60)
                 
-                time.sleep(self.config['check_interval'])
+                # stdin, stdout et stderr sont traités dans le thread courant
+                # (selectors), sans deadlock sur les pipes
+                # Le CPU n'a pas de limite noyau : surveillance par échantillonnage
+                # (RLIMIT_AS ou Job Object bornent la mémoire côté noyau)
+                stdout, stderr = self._monitor_with_polling(
+                    process, stdin_data, ps_process, start_time, results, verbose)
+            finally:
+                self._release_kernel_limits(limits)
             
-            # Attendre la fin des threads de lecture
-            stdout_thread.join(timeout=2)
-            stderr_thread.join(timeout=2)
+            # Un dépassement de RLIMIT_AS ou du Job Object fait échouer malloc
+            # alors que le RSS reste bas : on le repère à l'exception C++
+            if process.returncode != 0 and not results["memory_exceeded"] and any(
+                    marker in (stderr or b"") for marker in ALLOCATION_FAILURE_MARKERS):
+                results["memory_exceeded"] = True
+                if verbose:
+                    print("💥 MEMORY LIMIT EXCEEDED: allocation failed")
             
-            # Récupérer les données lues par les threads
-            results["stdout"] = ''.join(stdout_data)
-            results["stderr"] = ''.join(stderr_data)
+            # Pipes en mode binaire : décodage unique pour le rapport, les
+            # octets bruts sont écrits tels quels dans output_file
+            stdout = stdout or b""
+            results["stdout"] = stdout.decode("utf-8", errors="replace")
+            results["stderr"] = (stderr or b"").decode("utf-8", errors="replace")
             
             # Calculer les métriques
             results["execution_time"] = time.time() - start_time
             results["return_code"] = process.returncode
             
-            if memory_samples:
-                results["max_memory_used_mb"] = max(memory_samples)
-            
-            if cpu_samples:
-                results["avg_cpu_percent"] = sum(cpu_samples) / len(cpu_samples)
-            
             # Déterminer le succès
             results["success"] = (
                 process.returncode == 0 and
@@ -305,8 +241,8 @@ class ResourceLimiter:
             # Écrire stdout dans un fichier si spécifié
             if results["success"] and self.config.get('output_file'):
                 output_path = self.config['output_file']
-                with open(output_path, 'w') as f:
-                    f.write(results["stdout"])
+                with open(output_path, 'wb') as f:
+                    f.write(stdout)
                 if verbose:
                     print(f"📄 Output written to: {output_path}")
             
@@ -317,22 +253,346 @@ class ResourceLimiter:
         
         return results
     
+    def _terminate(self, process):
+        """Termine le processus (SIGTERM puis SIGKILL après 2s)"""
+        process.terminate()
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    
+    def _prepare_kernel_limits(self, verbose):
+        """
+        Prépare les limites côté noyau, avant le lancement du processus
+        
+        - Linux: RLIMIT_AS posé avant l'exec du programme, par prlimit
+          (util-linux) placé devant la commande, ce qui garde posix_spawn ;
+          à défaut par setrlimit dans un preexec_fn (fork+exec).
+          Pas de cgroup v2 : la règle "no internal processes" interdit
+          d'activer memory/cpu sous le cgroup (non racine) du superviseur
+        - Windows: Job Object avec JOB_OBJECT_LIMIT_PROCESS_MEMORY (pywin32),
+          assigné après le lancement par _assign_job_object
+        
+        Returns:
+            dict: "prefix" (commande placée devant l'exécutable), "preexec"
+            (fonction pour Popen), "job" (handle Windows) ;
+            vide si aucune limite noyau n'est disponible sur ce système
+        """
+        system = platform.system()
+        max_bytes = self.config['max_memory_mb'] * 1024 * 1024
+        
+        if system == 'Linux' and resource is not None:
+            if verbose:
+                print(f"🐧 Linux: RLIMIT_AS set ({self.config['max_memory_mb']} MB)")
+            
+            # prlimit pose la limite sur lui-même puis exécute le programme
+            # (même PID) : psutil et os.wait4 mesurent bien le programme
+            prlimit = shutil.which('prlimit')
+            if prlimit is not None:
+                return {"prefix": [prlimit, f"--as={max_bytes}", "--"]}
+            
+            def set_rlimit():
+                # Exécuté dans l'enfant entre fork et exec
+                resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+            
+            return {"preexec": set_rlimit}
+        
+        if system == 'Windows' and win32job is not None:
+            try:
+                job = win32job.CreateJobObject(None, "")
+                info = win32job.QueryInformationJobObject(job, win32job.JobObjectExtendedLimitInformation)
+                info['ProcessMemoryLimit'] = max_bytes
+                info['BasicLimitInformation']['LimitFlags'] |= (
+                    win32job.JOB_OBJECT_LIMIT_PROCESS_MEMORY |
+                    win32job.JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+                )
+                win32job.SetInformationJobObject(job, win32job.JobObjectExtendedLimitInformation, info)
+            except Exception as e:  # pywintypes.error
+                if verbose:
+                    print(f"⚠️  Cannot create Job Object: {e}")
+                return {}
+            return {"job": job}
+        
+        return {}
+    
+    def _assign_job_object(self, process, limits, verbose):
+        """Place le processus dans le Job Object préparé (Windows)"""
+        job = limits.get("job")
+        if job is None:
+            return
+        try:
+            handle = win32api.OpenProcess(win32con.PROCESS_ALL_ACCESS, False, process.pid)
+            win32job.AssignProcessToJobObject(job, handle)
+            win32api.CloseHandle(handle)
+        except Exception as e:  # pywintypes.error
+            if verbose:
+                print(f"⚠️  Cannot assign Job Object: {e}")
+            return
+        if verbose:
+            print(f"🪟 Windows: Job Object memory limit set")
+    
+    def _release_kernel_limits(self, limits):
+        """Libère le Job Object une fois le processus récolté"""
+        if limits.get("job") is not None:
+            win32api.CloseHandle(limits["job"])
+    
+    def _rusage_stats(self, usage):
+        """
+        Convertit le rusage propre à l'enfant (os.wait4)
+        
+        Returns:
+            tuple: (pic mémoire en MB, temps CPU en secondes)
+        """
+        if usage is None:
+            return 0.0, 0.0
+        # ru_maxrss est en octets sous macOS, en Ko ailleurs
+        unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return usage.ru_maxrss / unit, usage.ru_utime + usage.ru_stime
+    
+    def _communicate_posix(self, process, stdin_data, start_time, results, verbose, check=None):
+        """
+        Écrit stdin, vide stdout/stderr et récolte l'enfant dans le thread
+        courant (selectors + os.wait4), pour obtenir son rusage propre
+        
+        Args:
+            check: fonction appelée toutes les check_interval secondes,
+                   qui renvoie True pour arrêter le processus
+        
+        Returns:
+            tuple: (stdout, stderr, rusage de l'enfant)
+        """
+        interval = self.config['check_interval']
+        deadline = start_time + self.config['timeout_seconds']
+        pid = process.pid
+        output = {process.stdout: [], process.stderr: []}
+        open_pipes = len(output)
+        offset = 0
+        status = usage = None
+        kill_at = None
+        drain_until = None
+        next_check = time.time() + interval
+        
+        with selectors.DefaultSelector() as selector:
+            if stdin_data:
+                selector.register(process.stdin, selectors.EVENT_WRITE)
+            else:
+                process.stdin.close()
+            for pipe in output:
+                selector.register(pipe, selectors.EVENT_READ)
+            
+            # pidfd (Linux 5.3+) : réveil dès la fin de l'enfant, sinon
+            # os.wait4(WNOHANG) à chaque tour avec une attente courte
+            pidfd = None
+            if hasattr(os, 'pidfd_open'):
+                try:
+                    pidfd = os.pidfd_open(pid)
+                    selector.register(pidfd, selectors.EVENT_READ)
+                except OSError:
+                    pidfd = None
+            
+            while status is None or open_pipes:
+                now = time.time()
+                if status is None:
+                    # Popen.terminate() passe par poll() et récolterait l'enfant :
+                    # les signaux sont envoyés directement
+                    if kill_at is None and now > deadline:
+                        results["timeout"] = True
+                        if verbose:
+                            print(f"⏰ TIMEOUT after {now - start_time:.2f}s")
+                        os.kill(pid, signal.SIGTERM)
+                        kill_at = now + 2
+                    elif kill_at is None and check is not None and now >= next_check:
+                        next_check = now + interval
+                        if check():
+                            os.kill(pid, signal.SIGTERM)
+                            kill_at = now + 2
+                    elif kill_at is not None and now >= kill_at:
+                        os.kill(pid, signal.SIGKILL)
+                        kill_at = float('inf')
+                elif now > drain_until:
+                    break  # Un descendant garde les pipes ouverts
+                
+                timeout = interval if pidfd is not None else min(interval, 0.01)
+                for key, _ in selector.select(timeout):
+                    if key.fileobj is process.stdin:
+                        try:
+                            offset += os.write(key.fd, stdin_data[offset:offset + select.PIPE_BUF])
+                        except BrokenPipeError:
+                            offset = len(stdin_data)
+                        if offset >= len(stdin_data):
+                            selector.unregister(process.stdin)
+                            process.stdin.close()
+                    elif key.fileobj in output:
+                        data = os.read(key.fd, 32768)
+                        if data:
+                            output[key.fileobj].append(data)
+                        else:
+                            selector.unregister(key.fileobj)
+                            key.fileobj.close()
+                            open_pipes -= 1
+                
+                if status is None:
+                    waited, status, usage = os.wait4(pid, os.WNOHANG)
+                    if not waited:
+                        status = None
+                    else:
+                        # Enfant récolté : courte attente pour vider les pipes,
+                        # qu'un descendant peut garder ouverts indéfiniment
+                        drain_until = time.time() + 0.5
+                        if pidfd is not None:
+                            selector.unregister(pidfd)
+                            os.close(pidfd)
+                            pidfd = None
+        
+        for pipe in (process.stdin, process.stdout, process.stderr):
+            if not pipe.closed:
+                pipe.close()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        
+        return b"".join(output[process.stdout]), b"".join(output[process.stderr]), usage
+    
+    def _feed_stdin(self, pipe, data):
+        """Écrit l'entrée dans un thread dédié (Windows), puis ferme le pipe"""
+        try:
+            if data:
+                pipe.write(data)
+        except OSError:
+            pass  # Le programme s'est terminé sans tout lire
+        finally:
+            try:
+                pipe.close()
+            except OSError:
+                pass
+    
+    def _monitor_with_polling(self, process, stdin_data, ps_process, start_time, results, verbose):
+        """
+        Surveille le processus par échantillonnage psutil (sans cpu.max)
+        
+        Returns:
+            tuple: (stdout, stderr)
+        """
+        memory_samples = []
+        cpu_samples = []
+        cpu_exceeded_count = 0  # Compteur pour éviter les faux positifs
+        
+        def check():
+            """Mesure les ressources ; True si une limite est dépassée"""
+            nonlocal cpu_exceeded_count
+            try:
+                # Mémoire
+                mem_info = ps_process.memory_info()
+                memory_mb = mem_info.rss / (1024 * 1024)
+                memory_samples.append(memory_mb)
+                
+                # CPU (nécessite un intervalle pour être précis)
+                cpu_percent = ps_process.cpu_percent(interval=None)
+                if cpu_percent > 0:  # Ignorer les valeurs nulles initiales
+                    cpu_samples.append(cpu_percent)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                return False
+            
+            # Vérifier les limites de mémoire
+            if memory_mb > self.config['max_memory_mb']:
+                results["memory_exceeded"] = True
+                if verbose:
+                    print(f"💥 MEMORY LIMIT EXCEEDED: {memory_mb:.2f} MB")
+                return True
+            
+            # Vérifier et limiter le CPU
+            # Note: La limitation stricte du CPU sous Windows est complexe
+            # On utilise une approche de "kill si dépassement prolongé"
+            if cpu_percent > self.config['max_cpu_percent'] * 1.5:  # Tolérance de 50%
+                cpu_exceeded_count += 1
+                if cpu_exceeded_count >= 10:  # 10 échantillons consécutifs = 1 seconde
+                    results["cpu_exceeded"] = True
+                    if verbose:
+                        print(f"💥 CPU LIMIT EXCEEDED: {cpu_percent:.1f}% > {self.config['max_cpu_percent']}%")
+                    return True
+            else:
+                cpu_exceeded_count = 0  # Reset si le CPU redescend
+            return False
+        
+        if os.name != 'nt':
+            stdout, stderr, usage = self._communicate_posix(
+                process, stdin_data, start_time, results, verbose, check)
+            # Le rusage de l'enfant donne le pic exact, même entre deux échantillons
+            peak_mb, cpu_seconds = self._rusage_stats(usage)
+            memory_samples.append(peak_mb)
+            elapsed = time.time() - start_time
+            if not cpu_samples and elapsed > 0:
+                cpu_samples.append(cpu_seconds / elapsed * 100)
+        else:
+            stdout, stderr = self._poll_windows(process, stdin_data, start_time, results, verbose, check)
+        
+        if memory_samples:
+            results["max_memory_used_mb"] = max(memory_samples)
+        
+        if cpu_samples:
+            results["avg_cpu_percent"] = sum(cpu_samples) / len(cpu_samples)
+        
+        return stdout, stderr
+    
+    def _poll_windows(self, process, stdin_data, start_time, results, verbose, check):
+        """
+        Boucle de surveillance Windows : communicate() sert d'attente entre
+        deux échantillons, l'entrée est écrite par un thread dédié pour ne
+        jamais bloquer sur un pipe plein
+        
+        Returns:
+            tuple: (stdout, stderr)
+        """
+        # communicate() fermerait stdin : le pipe est confié au thread
+        writer = threading.Thread(target=self._feed_stdin, args=(process.stdin, stdin_data), daemon=True)
+        process.stdin = None
+        writer.start()
+        
+        stdout = stderr = None
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=self.config['check_interval'])
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            
+            # Vérifier le timeout
+            elapsed = time.time() - start_time
+            if elapsed > self.config['timeout_seconds']:
+                results["timeout"] = True
+                self._terminate(process)
+                if verbose:
+                    print(f"⏰ TIMEOUT after {elapsed:.2f}s")
+                break
+            
+            if check():
+                self._terminate(process)
+                break
+        
+        if stdout is None:
+            # Processus arrêté : récupérer la sortie restante
+            stdout, stderr = process.communicate()
+        writer.join()
+        
+        return stdout, stderr
+    
     def _prepare_input(self, input_data):
-        """Prépare les données d'entrée"""
+        """Prépare les données d'entrée (bytes, transmis tels quels sur stdin)"""
         if input_data is None:
             # Utiliser le fichier d'entrée de la config si spécifié
             if self.config.get('input_file'):
-                with open(self.config['input_file'], 'r') as f:
+                with open(self.config['input_file'], 'rb') as f:
                     return f.read()
             return None
         
         # Si c'est un chemin de fichier
         if isinstance(input_data, (str, Path)) and Path(input_data).exists():
-            with open(input_data, 'r') as f:
+            with open(input_data, 'rb') as f:
                 return f.read()
         
         # Sinon, traiter comme une chaîne
-        return str(input_data)
+        if isinstance(input_data, bytes):
+            return input_data
+        return str(input_data).encode("utf-8")
     
     def _print_results(self, results):
         """Affiche les résultats de manière formatée"""
@@ -0,0 +1,25 @@
+"""Compilation du noyau de score Cython (optionnel).
+
+    pip install cython
+    python setup.py build_ext --inplace
+
+compute_score.py utilise le module compilé s'il est présent, sinon numba
+ou numpy.
+"""
+import sys
+
+from setuptools import Extension, setup
+from Cython.Build import cythonize
+
+if sys.platform == "win32":
+    extra_compile_args = ["/O2", "/fp:fast"]
+else:
+    extra_compile_args = ["-O3", "-march=native", "-ffast-math"]
+
+setup(
+    name="score_kernel",
+    ext_modules=cythonize(
+        [Extension("_score_kernel", ["_score_kernel.pyx"],
+                   extra_compile_args=extra_compile_args)],
+    ),
+)